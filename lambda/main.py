@@ -3,18 +3,122 @@ import sys
 sys.path.insert(0, 'modules')
 import boto3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from botocore.config import Config
 import json
+try:
+    import orjson
+except ImportError: # orjson est une dépendance native : absent si modules/ n'a pas été préparé pour Lambda
+    orjson = None
 import logging
+import codecs
+import re
+import time
+import zlib
+import threading
+from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
-import csv
-import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-s3_client = boto3.client('s3')
-ssm_client = boto3.client('ssm')
-sns_client = boto3.client('sns')
+# orjson.JSONDecodeError hérite de json.JSONDecodeError : la gestion d'erreur est identique
+if orjson is not None:
+    json_loads = orjson.loads
+
+    def json_dumps(data):
+        """Sérialise en JSON via orjson, en retournant une chaîne comme json.dumps."""
+        return orjson.dumps(data).decode('utf-8')
+else:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+# Clients et session créés une seule fois par conteneur : les connexions restent ouvertes entre invocations
+boto_config = Config(tcp_keepalive=True)
+
+# Clients boto3 créés à la première utilisation : une invocation qui échoue tôt ne paie pas les trois.
+# La création d'un client n'est pas thread-safe (pagination et upload S3 utilisent des threads) d'où le verrou.
+aws_clients = {}
+aws_clients_lock = threading.Lock()
+
+# Nombre maximum d'appels simultanés à l'API lors de la pagination
+API_MAX_WORKERS = 8
+
+# Délais (connexion, lecture) en secondes, par essai. Ils sont réduits si besoin par api_timeout
+# pour que la requête et ses nouveaux essais se terminent avant l'échéance de l'invocation.
+API_TOKEN_TIMEOUT = (2, 5)
+API_PAGE_TIMEOUT = (2, 10)
+
+# Attente maximale imposée par un en-tête Retry-After (429/503) avant un nouvel essai
+API_RETRY_AFTER_MAX_SECONDS = 2
+
+# Nombre maximal d'essais d'une requête API (1 + les 2 nouveaux essais autorisés par Retry(total=2))
+API_MAX_ATTEMPTS = 3
+
+# Temps réservé, après les appels API, à l'upload S3 ou à la notification d'erreur avant le timeout de la Lambda
+API_DEADLINE_MARGIN_SECONDS = 10
+
+class CappedRetry(Retry):
+    """Retry dont l'attente demandée par l'en-tête Retry-After est plafonnée à API_RETRY_AFTER_MAX_SECONDS."""
+
+    def parse_retry_after(self, retry_after):
+        return min(super().parse_retry_after(retry_after), API_RETRY_AFTER_MAX_SECONDS)
+
+# POST est rejoué aussi : la demande de token (client_credentials) peut être répétée sans effet de bord.
+# Les lectures trop lentes ne sont pas rejouées : leur délai compte déjà fortement dans le timeout de la Lambda.
+API_SESSION = requests.Session()
+API_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=CappedRetry(
+        total=2,
+        connect=2,
+        read=0,
+        status=2,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET', 'POST']
+    )
+))
+
+def api_timeout(default_timeout, deadline=None):
+    """
+    Retourne le délai (connexion, lecture) d'une requête API, réduit pour que tous ses essais
+    (et les attentes entre eux) tiennent avant deadline.
+
+    Args:
+        default_timeout (tuple): Le délai (connexion, lecture) habituel de la requête.
+        deadline (float, optional): Échéance au sens de time.monotonic(). Sans échéance, default_timeout est retourné.
+
+    Raises:
+        TimeoutError: S'il ne reste plus assez de temps avant deadline pour lancer la requête.
+    """
+    if deadline is None:
+        return default_timeout
+    remaining = deadline - time.monotonic()
+    attempt_budget = (remaining - (API_MAX_ATTEMPTS - 1) * API_RETRY_AFTER_MAX_SECONDS) / API_MAX_ATTEMPTS
+    if attempt_budget <= 0:
+        raise TimeoutError(f"Temps restant insuffisant pour un nouvel appel API ({remaining:.1f} s avant l'échéance).")
+    connect_timeout, read_timeout = default_timeout
+    connect_timeout = min(connect_timeout, attempt_budget / 2)
+    return connect_timeout, min(read_timeout, attempt_budget - connect_timeout)
+
+# Nombre de lignes CSV assemblées en une seule chaîne avant d'être transmises à l'upload
+CSV_CHUNK_ROWS = 1000
+
+# Cache des paramètres SSM, conservé tant que le conteneur Lambda reste "chaud"
+SSM_CACHE_TTL_SECONDS = 300
+ssm_cache = {}
+
+# Niveau de compression gzip du fichier CSV (bon compromis taille / CPU pour du texte)
+GZIP_COMPRESSLEVEL = 6
+
+# Taille minimale d'une part d'upload multipart S3 (toutes sauf la dernière)
+S3_MULTIPART_PART_SIZE = 5 * 1024 * 1024
+# Nombre de parts envoyées simultanément (et donc gardées en mémoire) lors d'un upload multipart
+S3_UPLOAD_MAX_WORKERS = 4
 
 PAYMENT_STATE_TRANSLATIONS = {
     "Pending": "Paiement est planifiée à une date ultérieur, pas encore traité",
@@ -36,125 +140,237 @@ CASHOUT_STATE_TRANSLATIONS = {
     "Transfered": "Somme transférée sur le compte HelloAsso de l'association"
 }
 
-def convert_json_to_csv(json_data_list):
+def get_aws_client(service_name):
+    """Returns the shared boto3 client for service_name, creating it on first use."""
+    client = aws_clients.get(service_name)
+    if client is None:
+        with aws_clients_lock:
+            client = aws_clients.get(service_name)
+            if client is None:
+                client = boto3.client(service_name, config=boto_config)
+                aws_clients[service_name] = client
+    return client
+
+# Colonnes du fichier CSV, dans l'ordre des champs produits par iter_csv_chunks
+CSV_HEADERS = [
+    "Référence commande", "Référence du paiement", "Montant total", "Date du paiement",
+    "Statut du paiement", "Versé", "Date du versement", "Nom payeur", "Prénom payeur",
+    "Email payeur", "Date de naissance", "Raison sociale", "Adresse payeur",
+    "Code postal payeur", "Ville payeur", "Montant du tarif", "Attestation",
+    "Remboursement", "Status paiement (items)", "Description (items)"
+]
+
+def format_csv_row(values):
+    """
+    Formate une ligne CSV (séparateur ';', tous les champs entre guillemets, équivalent de csv.QUOTE_ALL).
+
+    Les guillemets internes sont doublés et None devient un champ vide. Les guillemets
+    d'encadrement sont posés en une seule jointure pour toute la ligne plutôt que champ par champ.
+    """
+    return '"' + '";"'.join(['' if v is None else str(v).replace('"', '""') for v in values]) + '"'
+
+# En-tête du fichier CSV, précédé du BOM UTF-8 (pour Excel) : calculé une seule fois au chargement
+CSV_HEADER_BYTES = codecs.BOM_UTF8 + (format_csv_row(CSV_HEADERS) + '\n').encode('utf-8')
+
+# Dates 'YYYY-MM-DD' valides quel que soit le mois (jour <= 28), seules ou suivies de 'T' et d'un chiffre
+ISO_DATE_RE = re.compile(r'(?!0000)(\d{4})-(0[1-9]|1[0-2])-(0[1-9]|1\d|2[0-8])(?=T\d|\Z)', re.ASCII)
+
+def format_iso_date(iso_date_str):
+    """
+    Convertit une date ISO-8601 ('YYYY-MM-DDTHH:MM:SS...') au format 'DD/MM/YYYY'.
+
+    La date est extraite par ISO_DATE_RE quand elle est valide pour tout mois ; les autres
+    (jours 29 à 31, autres formats, dates invalides) passent par datetime.fromisoformat, qui
+    lève ValueError si la date est invalide. La partie heure après 'T' n'est pas vérifiée.
     """
-    Convertit une liste de dictionnaires JSON (données de paiement) en une chaîne CSV.
+    match = ISO_DATE_RE.match(iso_date_str)
+    if match is not None:
+        return f"{match[3]}/{match[2]}/{match[1]}"
+    return datetime.fromisoformat(iso_date_str).strftime('%d/%m/%Y')
+
+def iter_csv_chunks(json_data_list, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Convertit une liste de dictionnaires JSON (données de paiement) en CSV, produit au fil de l'eau
+    par blocs de chunk_rows lignes (une seule jointure de chaîne par bloc).
 
     Args:
         json_data_list (list): La liste des éléments JSON récupérés de l'API.
+        chunk_rows (int, optional): Nombre de lignes par bloc produit.
 
-    Returns:
-        str: Une chaîne contenant les données au format CSV, incluant l'en-tête.
-             Retourne une chaîne vide avec seulement l'en-tête si json_data_list est vide.
+    Yields:
+        bytes: Des blocs de lignes CSV (terminées par '\\n') déjà encodés en UTF-8, en commençant
+               par le BOM et l'en-tête. Seul l'en-tête est produit si json_data_list est vide.
     """
     if not json_data_list:
         logger.warning("La liste de données JSON à convertir en CSV est vide.")
 
-    headers = [
-        "Référence commande", "Référence du paiement", "Montant total", "Date du paiement",
-        "Statut du paiement", "Versé", "Date du versement", "Nom payeur", "Prénom payeur",
-        "Email payeur", "Date de naissance", "Raison sociale", "Adresse payeur",
-        "Code postal payeur", "Ville payeur", "Montant du tarif", "Attestation",
-        "Remboursement", "Status paiement (items)", "Description (items)"
-    ]
+    yield CSV_HEADER_BYTES
 
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=';', quotechar='"', quoting=csv.QUOTE_ALL, lineterminator='\n')
-    writer.writerow(headers)
+    # Méthodes liées une seule fois, hors de la boucle par paiement
+    format_row = format_csv_row
+    warn = logger.warning
+    translate_payment_state = PAYMENT_STATE_TRANSLATIONS.get
+    translate_cashout_state = CASHOUT_STATE_TRANSLATIONS.get
+    format_date = format_iso_date
+    join_items = '/'.join
+    join_refunds = '\n'.join
+    is_instance = isinstance
 
+    # Liste pré-allouée et réutilisée d'un bloc à l'autre
+    rows = [None] * chunk_rows
+    row_count = 0
+    skipped_count = 0
+
+    # Les éléments non-dict sont rares : on tente l'accès à .get plutôt que de tester le type à chaque fois
     for payment in json_data_list:
-        if not isinstance(payment, dict):
-            logger.warning(f"Élément ignoré car ce n'est pas un dictionnaire : {payment}")
+        try:
+            get_payment = payment.get
+        except AttributeError:
+            warn("Élément ignoré car ce n'est pas un dictionnaire : %s", payment)
+            skipped_count += 1
             continue
 
-        order_info = payment.get('order', {}) or {} 
-        payer_info = payment.get('payer', {}) or {} 
-        items_list = payment.get('items', []) or [] 
-
-        item_amounts = '/'.join([str(item.get('amount', 0) / 100) for item in items_list if isinstance(item, dict)])
-        item_states = '/'.join([item.get('state', '') for item in items_list if isinstance(item, dict)])
-        item_names = '/'.join([item.get('name', '') for item in items_list if isinstance(item, dict)])
-
-        refund_ops = payment.get('refundOperations', [])
+        # Normalisation unique des objets imbriqués, puis accès via les méthodes .get liées
+        get_order = (get_payment('order') or {}).get
+        get_payer = (get_payment('payer') or {}).get
+        items_list = get_payment('items') or []
+
+        # Les montants sont des centimes entiers : str(x / 100) et f"{x / 100:.2f}" donnent déjà la
+        # chaîne décimale exacte, et restent plus rapides qu'un formatage divmod en arithmétique entière.
+        # Un seul parcours des items pour les trois colonnes
+        item_amounts_list = []
+        item_states_list = []
+        item_names_list = []
+        add_item_amount = item_amounts_list.append
+        add_item_state = item_states_list.append
+        add_item_name = item_names_list.append
+        for item in items_list:
+            try:
+                get_item = item.get
+            except AttributeError:
+                continue
+            add_item_amount(str(get_item('amount', 0) / 100))
+            add_item_state(get_item('state', ''))
+            add_item_name(get_item('name', ''))
+
+        item_amounts = join_items(item_amounts_list)
+        item_states = join_items(item_states_list)
+        item_names = join_items(item_names_list)
+
+        refund_ops = get_payment('refundOperations', [])
         formatted_refunds = []
+        add_refund = formatted_refunds.append
 
-        if isinstance(refund_ops, list):
+        if is_instance(refund_ops, list):
             for refund in refund_ops:
-                if isinstance(refund, dict):
-                    try:
-                        amount = refund.get('amount', 0) / 100
-                        meta = refund.get('meta', {}) or {}
-                        created_at_str = meta.get('createdAt')
-                        if created_at_str:
-                            created_at_dt = datetime.fromisoformat(created_at_str)
-                            date_str = created_at_dt.strftime('%d/%m/%Y')
-                            formatted_refunds.append(f"Remboursement de {amount:.2f} le {date_str}")
-                        else:
-                            formatted_refunds.append(f"Remboursement de {amount:.2f} (date inconnue)")
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Erreur lors du formatage d'un remboursement pour paiement {payment.get('id', 'N/A')}: {e} - Données: {refund}")
-                        formatted_refunds.append("Erreur formatage remboursement")
-                else:
-                     logger.warning(f"Élément de remboursement ignoré car ce n'est pas un dictionnaire : {refund}")
+                try:
+                    get_refund = refund.get
+                except AttributeError:
+                    warn("Élément de remboursement ignoré car ce n'est pas un dictionnaire : %s", refund)
+                    continue
+                try:
+                    amount = get_refund('amount', 0) / 100
+                    meta = get_refund('meta', {}) or {}
+                    created_at_str = meta.get('createdAt')
+                    if created_at_str:
+                        date_str = format_date(created_at_str)
+                        add_refund(f"Remboursement de {amount:.2f} le {date_str}")
+                    else:
+                        add_refund(f"Remboursement de {amount:.2f} (date inconnue)")
+                except (ValueError, TypeError, AttributeError) as e:
+                    warn("Erreur lors du formatage d'un remboursement pour paiement %s: %s - Données: %s", get_payment('id', 'N/A'), e, refund)
+                    add_refund("Erreur formatage remboursement")
         else:
-            logger.warning(f"Champ 'refundOperations' inattendu pour paiement {payment.get('id', 'N/A')}: {refund_ops}")
+            warn("Champ 'refundOperations' inattendu pour paiement %s: %s", get_payment('id', 'N/A'), refund_ops)
 
-        refund_ops_str = "\n".join(formatted_refunds)
+        refund_ops_str = join_refunds(formatted_refunds)
 
         # Look for translations into dictionnaries        
-        original_payment_state = payment.get('state', '')
-        translated_payment_state = PAYMENT_STATE_TRANSLATIONS.get(original_payment_state, original_payment_state)
+        original_payment_state = get_payment('state', '')
+        translated_payment_state = translate_payment_state(original_payment_state, original_payment_state)
 
-        original_cashout_state = payment.get('cashOutState', '')
-        translated_cashout_state = CASHOUT_STATE_TRANSLATIONS.get(original_cashout_state, original_cashout_state)
+        original_cashout_state = get_payment('cashOutState', '')
+        translated_cashout_state = translate_cashout_state(original_cashout_state, original_cashout_state)
 
 
-        row = [
-            order_info.get('id', ''),
-            payment.get('id', ''),
-            payment.get('amount', 0) / 100,
-            order_info.get('date', ''),
+        row = (
+            get_order('id', ''),
+            get_payment('id', ''),
+            get_payment('amount', 0) / 100,
+            get_order('date', ''),
             translated_payment_state,
             translated_cashout_state,
-            payment.get('cashOutDate', ''),
-            payer_info.get('lastName', ''),
-            payer_info.get('firstName', ''),
-            payer_info.get('email', ''),
-            payer_info.get('dateOfBirth', ''),
-            payer_info.get('company', ''),
-            payer_info.get('address', ''),
-            payer_info.get('zipCode', ''),
-            payer_info.get('city', ''),
+            get_payment('cashOutDate', ''),
+            get_payer('lastName', ''),
+            get_payer('firstName', ''),
+            get_payer('email', ''),
+            get_payer('dateOfBirth', ''),
+            get_payer('company', ''),
+            get_payer('address', ''),
+            get_payer('zipCode', ''),
+            get_payer('city', ''),
             item_amounts,
-            payment.get('paymentReceiptUrl', ''),
+            get_payment('paymentReceiptUrl', ''),
             refund_ops_str,
             item_states,
             item_names
-        ]
-        writer.writerow(row)
+        )
+        rows[row_count] = format_row(row)
+        row_count += 1
+        if row_count == chunk_rows:
+            yield ('\n'.join(rows) + '\n').encode('utf-8')
+            row_count = 0
+
+    if row_count:
+        yield ('\n'.join(rows[:row_count]) + '\n').encode('utf-8')
 
-    csv_content = output.getvalue()
-    output.close()
-    logger.info(f"Conversion en CSV terminée. {len(json_data_list)} enregistrements traités.")
-    return csv_content
+    logger.info("Conversion en CSV terminée. %s enregistrements convertis, %s ignoré(s).", len(json_data_list) - skipped_count, skipped_count)
 
-def get_ssm_parameter(parameter_name, with_decryption=False):
-    """Fetches a parameter from AWS Systems Manager Parameter Store."""
+def get_ssm_parameters(parameter_names, with_decryption=False):
+    """
+    Fetches several parameters from AWS Systems Manager Parameter Store in a single call.
+
+    Each value is cached for SSM_CACHE_TTL_SECONDS under (name, with_decryption), so warm
+    invocations of the same container only ask SSM for missing or expired parameters.
+    Returns a dict {parameter_name: value}. Raises if any of the parameters is not found.
+    """
+    now = time.monotonic()
+    values = {}
+    missing_names = []
+    for name in parameter_names:
+        cached = ssm_cache.get((name, with_decryption))
+        if cached is not None and now - cached[0] < SSM_CACHE_TTL_SECONDS:
+            values[name] = cached[1]
+        else:
+            missing_names.append(name)
+
+    if not missing_names:
+        logger.info("Using cached SSM parameters.")
+        return values
+
+    ssm_client = get_aws_client('ssm')
     try:
-        response = ssm_client.get_parameter(
-            Name=parameter_name,
+        response = ssm_client.get_parameters(
+            Names=missing_names,
             WithDecryption=with_decryption
         )
-        return response['Parameter']['Value']
-    except ssm_client.exceptions.ParameterNotFound:
-        logger.error(f"SSM parameter not found: {parameter_name}")
-        raise
     except Exception as e:
-        logger.error(f"Error fetching SSM parameter {parameter_name}: {e}")
+        logger.error("Error fetching SSM parameters %s: %s", missing_names, e)
         raise
 
-def get_api_token(token_url, client_id, client_secret):
-    """Gets an OAuth token from the API."""
+    invalid_parameters = response.get('InvalidParameters', [])
+    if invalid_parameters:
+        logger.error("SSM parameter(s) not found: %s", invalid_parameters)
+        raise Exception(f"SSM parameter(s) not found: {', '.join(invalid_parameters)}")
+
+    fetched_at = time.monotonic()
+    for parameter in response['Parameters']:
+        values[parameter['Name']] = parameter['Value']
+        ssm_cache[(parameter['Name'], with_decryption)] = (fetched_at, parameter['Value'])
+    return values
+
+def get_api_token(token_url, client_id, client_secret, deadline=None):
+    """Gets an OAuth token from the API, giving up before deadline (see api_timeout)."""
     try:
         payload = {
             'grant_type': 'client_credentials',
@@ -164,23 +380,108 @@ def get_api_token(token_url, client_id, client_secret):
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded'
         }
-        response = requests.post(token_url, data=payload, headers=headers, timeout=10)
+        response = API_SESSION.post(token_url, data=payload, headers=headers, timeout=api_timeout(API_TOKEN_TIMEOUT, deadline))
         response.raise_for_status() 
-        token_data = response.json()
+        token_data = json_loads(response.content)
         logger.info("Successfully obtained API token.")
         return token_data.get('access_token')
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error getting API token from {token_url}: {e}")
+        logger.error("Error getting API token from %s: %s", token_url, e)
         raise
     except Exception as e:
-        logger.error(f"Unexpected error during token retrieval: {e}")
+        logger.error("Unexpected error during token retrieval: %s", e)
         raise
 
-def call_api(base_api_url, token, from_date_str=None, to_date_str=None):
+def fetch_api_page(session, base_api_url, headers, params, page_num, deadline=None):
+    """
+    Appelle l'API pour une page donnée et retourne la réponse JSON décodée.
+
+    Le délai de la requête est réduit pour se terminer avant deadline (voir api_timeout).
+    Les erreurs sont journalisées avec le numéro de page puis propagées.
+    """
+    try:
+        response = session.get(base_api_url, headers=headers, params=params, timeout=api_timeout(API_PAGE_TIMEOUT, deadline))
+        response.raise_for_status() # Check for HTTP errors (4xx, 5xx)
+        return json_loads(response.content)
+
+    except requests.exceptions.RequestException as e:
+        if e.response is not None:
+                logger.error("Erreur lors de l'appel API (page %s). Statut: %s. Réponse: %s", page_num, e.response.status_code, e.response.content[:500].decode('utf-8', errors='replace'))
+        else:
+                logger.error("Erreur réseau lors de l'appel API (page %s): %s", page_num, e)
+        raise # Propager l'exception pour arrêter le processus global
+    except json.JSONDecodeError as e:
+        logger.error("Erreur de décodage JSON (page %s): %s", page_num, e)
+        try:
+            logger.error("Texte de la réponse : %s", response.content[:500].decode('utf-8', errors='replace'))
+        except NameError: # response pourrait ne pas être définie si l'erreur est très tôt
+            pass
+        raise # Propager l'exception
+    except Exception as e:
+        logger.error("Erreur inattendue lors de l'appel API (page %s): %s", page_num, e, exc_info=True)
+        raise # Propager l'exception
+
+def fetch_remaining_pages(session, base_api_url, headers, base_params, total_pages, deadline=None):
+    """
+    Récupère en parallèle les pages 2 à total_pages via le paramètre 'pageIndex'.
+    Les pages encore en file à l'échéance deadline échouent sans être appelées.
+
+    Returns:
+        list: Les éléments des pages récupérées, dans l'ordre des pages.
+              Retourne None si l'API n'a pas respecté le 'pageIndex' demandé
+              (l'appelant doit alors repasser en pagination par continuationToken).
+    """
+    page_items = {}
+
+    # Pas de bloc 'with' : sa sortie attendrait toutes les pages restantes (avec leurs retries)
+    # avant de propager une erreur ; les pages pas encore lancées sont annulées à la place
+    executor = ThreadPoolExecutor(max_workers=API_MAX_WORKERS)
+    try:
+        futures = {
+            executor.submit(fetch_api_page, session, base_api_url, headers, {**base_params, 'pageIndex': page_index}, page_index, deadline): page_index
+            for page_index in range(2, total_pages + 1)
+        }
+        for future in as_completed(futures):
+            page_index = futures[future]
+            page_response = future.result()
+
+            current_page_items = page_response.get('data')
+            pagination_info = page_response.get('pagination') or {}
+
+            if not isinstance(current_page_items, list) or pagination_info.get('pageIndex') != page_index:
+                logger.warning("Réponse inattendue pour pageIndex %s (pageIndex reçu: %s). Abandon de la récupération parallèle.", page_index, pagination_info.get('pageIndex'))
+                executor.shutdown(wait=False, cancel_futures=True)
+                return None
+
+            logger.info("Page %s: %s éléments récupérés.", page_index, len(current_page_items))
+            page_items[page_index] = current_page_items
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=False)
+
+    all_items = []
+    for page_index in sorted(page_items):
+        all_items.extend(page_items[page_index])
+    return all_items
+
+@dataclass
+class ExecutionContext:
+    """Avancement de l'exécution, repris dans la notification d'erreur."""
+    from_date_str: str = 'N/A'
+    to_date_str: str = 'N/A'
+    step: str = 'initialisation'
+    page_num: str = 'N/A' # Renseigné uniquement pendant la pagination de l'API
+
+def call_api(base_api_url, token, from_date_str=None, to_date_str=None, execution_context=None, deadline=None):
     """
     Appelle l'API cible, gère la pagination via continuationToken et totalPages,
     et retourne une liste combinée des données.
 
+    La première page est appelée seule pour connaître 'totalPages' ; les pages suivantes
+    sont ensuite récupérées en parallèle via 'pageIndex'. Si l'API ne respecte pas
+    'pageIndex', la pagination se poursuit séquentiellement via continuationToken.
+
     Hypothèses sur la structure de la réponse API :
     - Clé des données : 'data' (liste des éléments de la page)
     - Clé de pagination : 'pagination' (objet contenant les métadonnées)
@@ -191,6 +492,8 @@ def call_api(base_api_url, token, from_date_str=None, to_date_str=None):
         token (str): Le jeton Bearer pour l'authentification.
         from_date_str (str, optional): Date de début (YYYY-MM-DD).
         to_date_str (str, optional): Date de fin (YYYY-MM-DD).
+        execution_context (ExecutionContext, optional): Mis à jour avec la page en cours de traitement.
+        deadline (float, optional): Échéance (time.monotonic()) après laquelle plus aucune page n'est appelée.
 
     Returns:
         list: Une liste contenant tous les éléments de données combinés de toutes les pages.
@@ -199,7 +502,7 @@ def call_api(base_api_url, token, from_date_str=None, to_date_str=None):
     Raises:
         requests.exceptions.RequestException: Si une erreur réseau ou HTTP se produit.
         json.JSONDecodeError: Si une réponse de page n'est pas un JSON valide.
-        KeyError: Si les clés attendues sont manquantes.
+        TimeoutError: Si l'échéance deadline est atteinte avant la fin de la pagination.
         Exception: Pour d'autres erreurs inattendues.
     """
     page_size = 100
@@ -218,163 +521,272 @@ def call_api(base_api_url, token, from_date_str=None, to_date_str=None):
 
     base_params['withCount'] = "true"
 
+    # Un seul dictionnaire de paramètres pour toutes les pages séquentielles : seul continuationToken change
+    params = dict(base_params)
 
     while True:
+        if execution_context is not None:
+            execution_context.page_num = str(page_num)
 
-        params = base_params.copy()
         if current_continuation_token:
             params['continuationToken'] = current_continuation_token
-            logger.info(f"Appel API page {page_num} avec continuationToken: {current_continuation_token[:10]}...")
+            logger.info("Appel API page %s avec continuationToken: %s...", page_num, current_continuation_token[:10])
         else:
-            logger.info(f"Appel API page {page_num} (initial) : {base_api_url}, Params: {params}")
+            logger.info("Appel API page %s (initial) : %s, Params: %s", page_num, base_api_url, params)
 
-        try:
-            response = requests.get(base_api_url, headers=headers, params=params, timeout=30)
-            response.raise_for_status() # Check for HTTP errors (4xx, 5xx)
-            page_response = response.json()
+        page_response = fetch_api_page(API_SESSION, base_api_url, headers, params, page_num, deadline)
 
-            data_key = 'data'
-            pagination_key = 'pagination'
+        data_key = 'data'
+        pagination_key = 'pagination'
 
-            current_page_items = page_response.get(data_key)
-            pagination_info = page_response.get(pagination_key)
+        current_page_items = page_response.get(data_key)
+        pagination_info = page_response.get(pagination_key)
 
-            if current_page_items is None or not isinstance(current_page_items, list):
-                logger.warning(f"Clé '{data_key}' non trouvée ou n'est pas une liste dans la réponse de la page {page_num}. Arrêt de la pagination.")
-                break 
+        if current_page_items is None or not isinstance(current_page_items, list):
+            logger.warning("Clé '%s' non trouvée ou n'est pas une liste dans la réponse de la page %s. Arrêt de la pagination.", data_key, page_num)
+            break 
 
-            if pagination_info is None or not isinstance(pagination_info, dict):
-                    logger.warning(f"Clé '{pagination_key}' non trouvée ou n'est pas un dictionnaire dans la réponse de la page {page_num}. Arrêt de la pagination.")
-                    all_items.extend(current_page_items) 
-                    break
+        if pagination_info is None or not isinstance(pagination_info, dict):
+                logger.warning("Clé '%s' non trouvée ou n'est pas un dictionnaire dans la réponse de la page %s. Arrêt de la pagination.", pagination_key, page_num)
+                all_items.extend(current_page_items) 
+                break
+
+        logger.info("Page %s: %s éléments récupérés.", page_num, len(current_page_items))
+        all_items.extend(current_page_items)
+
+        current_page_index = pagination_info.get('pageIndex')
+        total_pages = pagination_info.get('totalPages')
+        next_continuation_token = pagination_info.get('continuationToken')
+
+        if total_pages is None or current_page_index is None:
+             logger.warning("Informations de pagination manquantes (totalPages ou pageIndex) sur la page %s. Arrêt.", page_num)
+             break
+
+        if current_page_index >= total_pages:
+            logger.info("Fin de la pagination atteinte (pageIndex %s >= totalPages %s).", current_page_index, total_pages)
+            break
+
+        if page_num == 1:
+            logger.info("Récupération parallèle des pages 2 à %s (%s appels simultanés max).", total_pages, API_MAX_WORKERS)
+            if execution_context is not None:
+                execution_context.page_num = f"2 à {total_pages}"
+            remaining_items = fetch_remaining_pages(API_SESSION, base_api_url, headers, base_params, total_pages, deadline)
+            if remaining_items is not None:
+                all_items.extend(remaining_items)
+                page_num = total_pages
+                break
+            logger.warning("Repli sur la pagination séquentielle via continuationToken.")
 
-            logger.info(f"Page {page_num}: {len(current_page_items)} éléments récupérés.")
-            all_items.extend(current_page_items)
+        if next_continuation_token:
+            current_continuation_token = next_continuation_token
+            page_num += 1
+        else:
+            logger.warning("Arrêt car pageIndex (%s) < totalPages (%s) mais aucun continuationToken n'a été fourni.", current_page_index, total_pages)
+            break
 
-            current_page_index = pagination_info.get('pageIndex')
-            total_pages = pagination_info.get('totalPages')
-            next_continuation_token = pagination_info.get('continuationToken')
+    logger.info("Pagination terminée. Total de %s éléments récupérés sur %s page(s) traitée(s).", len(all_items), page_num)
 
-            if total_pages is None or current_page_index is None:
-                 logger.warning(f"Informations de pagination manquantes (totalPages ou pageIndex) sur la page {page_num}. Arrêt.")
-                 break
+    return all_items
 
-            if current_page_index >= total_pages:
-                logger.info(f"Fin de la pagination atteinte (pageIndex {current_page_index} >= totalPages {total_pages}).")
-                break
 
-            if next_continuation_token:
-                current_continuation_token = next_continuation_token
-                page_num += 1
-            else:
-                logger.warning(f"Arrêt car pageIndex ({current_page_index}) < totalPages ({total_pages}) mais aucun continuationToken n'a été fourni.")
-                break
 
+def gzip_chunks(chunks, compresslevel=GZIP_COMPRESSLEVEL):
+    """Compresse au format gzip, au fil de l'eau, une suite de blocs d'octets."""
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+    yield compressor.flush()
 
+def upload_csv_to_s3(csv_chunks, bucket_name, s3_key, compress=False):
+    """
+    Envoie le CSV sur S3 au fur et à mesure de sa production.
 
-        except requests.exceptions.RequestException as e:
-            if e.response is not None:
-                    logger.error(f"Erreur lors de l'appel API (page {page_num}). Statut: {e.response.status_code}. Réponse: {e.response.text[:500]}")
-            else:
-                    logger.error(f"Erreur réseau lors de l'appel API (page {page_num}): {e}")
-            raise # Propager l'exception pour arrêter le processus global
-        except json.JSONDecodeError as e:
-            logger.error(f"Erreur de décodage JSON (page {page_num}): {e}")
-            try:
-                logger.error(f"Texte de la réponse : {response.text[:500]}")
-            except NameError: # response pourrait ne pas être définie si l'erreur est très tôt
-                pass
-            raise # Propager l'exception
-        except KeyError as e:
-                logger.error(f"Clé manquante dans la réponse API (page {page_num}): {e}. Réponse reçue: {page_response}")
-                raise # Propager l'exception
-        except Exception as e:
-            logger.error(f"Erreur inattendue lors de l'appel API (page {page_num}): {e}", exc_info=True)
-            raise # Propager l'exception
-
-    logger.info(f"Pagination terminée. Total de {len(all_items)} éléments récupérés sur {page_num} page(s) traitée(s).")
+    Les blocs d'octets sont regroupés en parts d'au moins S3_MULTIPART_PART_SIZE octets envoyées
+    via un upload multipart, jusqu'à S3_UPLOAD_MAX_WORKERS parts en parallèle pendant que la
+    production du CSV continue. Si tout le contenu tient dans une seule part, un simple
+    put_object est utilisé. En cas d'erreur, l'upload multipart est annulé.
 
-    return all_items
+    Si compress est vrai, le contenu est compressé en gzip à la volée et stocké avec
+    'Content-Encoding: gzip' : navigateurs et clients HTTP le décompressent au téléchargement.
+    """
+    s3_client = get_aws_client('s3')
+    object_args = {'ContentType': 'text/csv; charset=utf-8'}
+    if compress:
+        csv_chunks = gzip_chunks(csv_chunks)
+        object_args['ContentEncoding'] = 'gzip'
+
+    buffer = []
+    buffer_size = 0
+    upload_id = None
+    part_futures = []
+
+    def upload_part(part_number, body):
+        response = s3_client.upload_part(
+            Bucket=bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        logger.info("Uploaded part %s (%s bytes).", part_number, len(body))
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    executor = ThreadPoolExecutor(max_workers=S3_UPLOAD_MAX_WORKERS)
+    try:
+        for chunk in csv_chunks:
+            buffer.append(chunk)
+            buffer_size += len(chunk)
+
+            if buffer_size >= S3_MULTIPART_PART_SIZE:
+                if upload_id is None:
+                    upload_id = s3_client.create_multipart_upload(
+                        Bucket=bucket_name,
+                        Key=s3_key,
+                        **object_args
+                    )['UploadId']
+                    logger.info("Started multipart upload (UploadId: %s...)", upload_id[:10])
+
+                # Limiter les parts en attente pour borner la mémoire utilisée
+                if len(part_futures) >= S3_UPLOAD_MAX_WORKERS:
+                    part_futures[-S3_UPLOAD_MAX_WORKERS].result()
+
+                part_futures.append(executor.submit(upload_part, len(part_futures) + 1, b''.join(buffer)))
+                buffer = []
+                buffer_size = 0
+
+        if upload_id is None:
+            s3_client.put_object(
+                Bucket=bucket_name,
+                Key=s3_key,
+                Body=b''.join(buffer),
+                **object_args
+            )
+            return
 
+        if buffer:
+            part_futures.append(executor.submit(upload_part, len(part_futures) + 1, b''.join(buffer)))
 
+        parts = [future.result() for future in part_futures]
 
-def save_to_s3_and_get_presigned_url(csv_content, bucket_name, environment, expiration_seconds):
+        s3_client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+        logger.info("Completed multipart upload (%s part(s)).", len(parts))
+
+    except Exception:
+        if upload_id is not None:
+            logger.warning("Aborting multipart upload (UploadId: %s...)", upload_id[:10])
+            executor.shutdown(wait=True, cancel_futures=True)
+            s3_client.abort_multipart_upload(Bucket=bucket_name, Key=s3_key, UploadId=upload_id)
+        raise
+    finally:
+        executor.shutdown(wait=False)
+
+def build_s3_key(environment, now_utc):
+    """
+    Construit la clé S3 du fichier d'extraction : <environment>/<année>/<mois>-<jour>/HelloAsso-Payements-Extract-<horodatage>.csv
+
+    Args:
+        environment (str): L'environnement (ex: dev, prod) pour le préfixe S3.
+        now_utc (datetime): L'heure de l'exécution (UTC).
+
+    Returns:
+        str: La clé S3.
+    """
+    timestamp = now_utc.strftime("%Y-%m-%dT%H%M%SZ")
+    folder = f"{now_utc.year}/{now_utc.month:02d}-{now_utc.day:02d}"
+    return f"{environment}/{folder}/HelloAsso-Payements-Extract-{timestamp}.csv"
+
+def save_to_s3_and_get_presigned_url(csv_chunks, bucket_name, s3_key, expiration_seconds, compress=False):
     """
     Sauvegarde le contenu CSV sur S3 et génère une URL pré-signée pour les requêtes GET.
 
+    La clé est calculée par l'appelant (voir build_s3_key) : un nouvel appel avec les mêmes
+    arguments réécrit le même objet.
+
     Args:
-        csv_content (str): Le contenu du fichier CSV sous forme de chaîne.
+        csv_chunks (iterable): Les blocs d'octets du fichier CSV (voir iter_csv_chunks).
         bucket_name (str): Le nom du bucket S3.
-        environment (str): L'environnement (ex: dev, prod) pour le préfixe S3.
+        s3_key (str): La clé de l'objet S3.
         expiration_seconds (int): La durée de validité de l'URL pré-signée en secondes.
+        compress (bool, optional): Compresser le fichier en gzip (voir upload_csv_to_s3).
 
     Returns:
-        tuple: Un tuple contenant (presigned_url, expiration_time)
-               - presigned_url (str): L'URL pré-signée.
-               - expiration_time (datetime): L'heure d'expiration de l'URL.
+        str: L'URL pré-signée.
     """
+    s3_client = get_aws_client('s3')
     try:
-        now_utc = datetime.now(timezone.utc)
-
-        timestamp = now_utc.strftime("%Y-%m-%dT%H%M%SZ")
-        folder = f"{now_utc.year}/{now_utc.month:02d}-{now_utc.day:02d}"
-        s3_key = f"{environment}/{folder}/HelloAsso-Payements-Extract-{timestamp}.csv"
-        logger.info(f"Uploading CSV data to s3://{bucket_name}/{s3_key}")
+        logger.info("Uploading CSV data to s3://%s/%s", bucket_name, s3_key)
 
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=s3_key,
-            Body=csv_content.encode('utf-8-sig'),
-            ContentType='text/csv; charset=utf-8'
-        )
+        upload_csv_to_s3(csv_chunks, bucket_name, s3_key, compress)
         logger.info("Successfully uploaded CSV data to S3.")
 
-        expiration_time = now_utc + timedelta(seconds=expiration_seconds)
-        logger.info(f"Calculated expiration time: {expiration_time.isoformat()}")
-
         presigned_url = s3_client.generate_presigned_url(
             'get_object',
             Params={'Bucket': bucket_name, 'Key': s3_key},
             ExpiresIn=expiration_seconds
         )
-        logger.info(f"Generated presigned URL (expires in {expiration_seconds}s, {expiration_time.isoformat()}): {presigned_url}")
 
-        return presigned_url, expiration_time
+        logger.info("Generated presigned URL (expires in %ss): %s", expiration_seconds, presigned_url)
+
+        return presigned_url
 
     except s3_client.exceptions.ClientError as e:
         error_code = e.response.get("Error", {}).get("Code")
-        logger.error(f"AWS S3 client error ({error_code}): {e}")
+        logger.error("AWS S3 client error (%s): %s", error_code, e)
         raise
     except Exception as e:
-        logger.error(f"Error saving CSV to S3 or generating presigned URL: {e}", exc_info=True) # Ajouter exc_info
+        logger.error("Error saving CSV to S3 or generating presigned URL: %s", e, exc_info=True) # Ajouter exc_info
         raise
 
-def publish_sns_notification(topic_arn, subject, message):
-    """Publishes a message to the specified SNS topic."""
+def publish_sns_notifications(topic_arn, notifications):
+    """
+    Publishes messages to the specified SNS topic in a single PublishBatch call.
+
+    Args:
+        topic_arn (str): The SNS topic ARN.
+        notifications (list): Up to 10 dicts with 'Subject' and 'Message' keys.
+
+    Returns:
+        bool: True if every message was published, False otherwise.
+    """
+    sns_client = get_aws_client('sns')
+    entries = [
+        {'Id': str(index), 'Subject': notification['Subject'], 'Message': notification['Message']}
+        for index, notification in enumerate(notifications)
+    ]
     try:
-        logger.info(f"Publishing notification to SNS topic: {topic_arn}")
-        response = sns_client.publish(
+        logger.info("Publishing %s notification(s) to SNS topic: %s", len(entries), topic_arn)
+        response = sns_client.publish_batch(
             TopicArn=topic_arn,
-            Message=message,
-            Subject=subject
+            PublishBatchRequestEntries=entries
         )
-        logger.info(f"Successfully published message to SNS (Message ID: {response.get('MessageId')})")
-        return True
+        for failed in response.get('Failed', []):
+            logger.error("SNS message %s was not published (%s): %s", failed.get('Id'), failed.get('Code'), failed.get('Message'))
+        successful_ids = [successful.get('MessageId') for successful in response.get('Successful', [])]
+        logger.info("Successfully published %s message(s) to SNS (Message IDs: %s)", len(successful_ids), successful_ids)
+        return not response.get('Failed')
     except sns_client.exceptions.NotFoundException:
-        logger.error(f"SNS topic not found: {topic_arn}")
+        logger.error("SNS topic not found: %s", topic_arn)
         return False
     except sns_client.exceptions.ClientError as e:
         error_code = e.response.get("Error", {}).get("Code")
-        logger.error(f"AWS SNS client error ({error_code}) publishing to {topic_arn}: {e}")
+        logger.error("AWS SNS client error (%s) publishing to %s: %s", error_code, topic_arn, e)
         return False
     except Exception as e:
-        logger.error(f"Unexpected error publishing to SNS topic {topic_arn}: {e}", exc_info=True)
+        logger.error("Unexpected error publishing to SNS topic %s: %s", topic_arn, e, exc_info=True)
         return False
 
 def lambda_handler(event, context):
     logger.info("Lambda execution started.")
     sns_topic_arn = None
     environment = os.environ.get('ENVIRONMENT', 'dev') 
+    execution_context = ExecutionContext()
 
     try:
         api_url_param = os.environ['API_URL_PARAM_NAME']
@@ -386,19 +798,33 @@ def lambda_handler(event, context):
         sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
         success_sns_subject_template = os.environ['SUCCESS_SNS_SUBJECT_TEMPLATE']
         error_sns_subject_template = os.environ['ERROR_SNS_SUBJECT_TEMPLATE']
+        compress_results = os.environ.get('COMPRESS_RESULTS', 'true').lower() == 'true'
 
+        # Les appels API s'arrêtent API_DEADLINE_MARGIN_SECONDS avant le timeout de la Lambda,
+        # pour garder le temps d'envoyer le résultat sur S3 ou la notification d'erreur
+        api_deadline = None
+        if context is not None:
+            api_deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - API_DEADLINE_MARGIN_SECONDS
 
         # Récupérer les valeurs des paramètres depuis SSM
+        execution_context.step = 'lecture de la configuration (Parameter Store)'
         logger.info("Fetching configuration from Parameter Store...")
-        api_url = get_ssm_parameter(api_url_param)
-        token_url = get_ssm_parameter(token_url_param)
-        client_id = get_ssm_parameter(client_id_param, with_decryption=True)
-        client_secret = get_ssm_parameter(client_secret_param, with_decryption=True)
+        # Un seul appel GetParameters (max 10 noms) ; le déchiffrement est sans effet sur les paramètres 'String'
+        parameters = get_ssm_parameters(
+            [api_url_param, token_url_param, client_id_param, client_secret_param],
+            with_decryption=True
+        )
+        api_url = parameters[api_url_param]
+        token_url = parameters[token_url_param]
+        client_id = parameters[client_id_param]
+        client_secret = parameters[client_secret_param]
         logger.info("Configuration fetched successfully.")
 
         # --- Calcul des dates (mois précédent complet) ---
         logger.info("Calculating 'from' and 'to' dates for the previous month...")
-        today = datetime.now(timezone.utc).date()
+        # Une seule lecture de l'horloge : dates, clé S3 et expiration en dérivent
+        now_utc = datetime.now(timezone.utc)
+        today = now_utc.date()
 
         first_day_current_month = today.replace(day=1)
         
@@ -408,46 +834,59 @@ def lambda_handler(event, context):
         from_date = to_date_previous_month.replace(day=1)
         from_date_str = from_date.strftime('%Y-%m-%d')
         to_date_str = to_date.strftime('%Y-%m-%d')
+        execution_context.from_date_str = from_date_str
+        execution_context.to_date_str = to_date_str
 
-        logger.info(f"Calculated dates for previous month: from={from_date_str}, to={to_date_str}")
+        logger.info("Calculated dates for previous month: from=%s, to=%s", from_date_str, to_date_str)
 
         # 1. Obtenir le token d'authentification
+        execution_context.step = "obtention du token API"
         logger.info("Getting API token...")
-        api_token = get_api_token(token_url, client_id, client_secret)
+        api_token = get_api_token(token_url, client_id, client_secret, deadline=api_deadline)
         if not api_token:
             raise Exception("Failed to obtain API token.")
 
         # 2. Appeler l'API cible
+        execution_context.step = "appel de l'API"
         logger.info("Calling target API...")
         all_api_items = call_api(
             base_api_url=api_url,
             token=api_token,
             from_date_str=from_date_str,
-            to_date_str=to_date_str
+            to_date_str=to_date_str,
+            execution_context=execution_context,
+            deadline=api_deadline
         )
+        execution_context.page_num = 'N/A'
 
         if all_api_items is None: 
              raise Exception("API call function returned None unexpectedly.")
         if not all_api_items:
             logger.warning("API call completed, but no items were retrieved after handling pagination.")
 
-        # --- 3. Convertir les données JSON en CSV ---
-        logger.info(f"Converting {len(all_api_items)} items to CSV format...")
-        csv_data = convert_json_to_csv(all_api_items)
+        # --- 3. Convertir les données JSON en CSV (lignes produites pendant l'upload) ---
+        execution_context.step = 'conversion CSV et sauvegarde sur S3'
+        logger.info("Converting %s items to CSV format...", len(all_api_items))
+        csv_chunks = iter_csv_chunks(all_api_items)
 
 
 
         # 4. Sauvegarder les résultats sur S3 et obtenir l'URL pré-signée
         logger.info("Saving CSV results to S3 and generating presigned URL...")
-        result_url, expiration_datetime = save_to_s3_and_get_presigned_url(
-            csv_content=csv_data, # Utiliser les données CSV
+        s3_key = build_s3_key(environment, now_utc)
+        expiration_datetime = now_utc + timedelta(seconds=presigned_url_expiration_seconds)
+        logger.info("Calculated expiration time: %s", expiration_datetime.isoformat())
+        result_url = save_to_s3_and_get_presigned_url(
+            csv_chunks=csv_chunks, # Utiliser les données CSV
             bucket_name=s3_bucket_name,
-            environment=environment,
-            expiration_seconds=presigned_url_expiration_seconds
+            s3_key=s3_key,
+            expiration_seconds=presigned_url_expiration_seconds,
+            compress=compress_results
         )
 
         # 5. Publier l'URL pré-signée sur SNS (si l'ARN est configuré)
         if sns_topic_arn:
+            execution_context.step = 'notification SNS'
             logger.info("Preparing SNS notification...")
 
             expiration_str = expiration_datetime.strftime("%Y-%m-%d %H:%M:%S %Z")
@@ -458,12 +897,7 @@ def lambda_handler(event, context):
                 environment=environment
             )
 
-            warning_message = ""
-            if len(all_api_items) == 100:
-                warning_message = "ATTENTION : Le nombre d'enregistrements récupérés est exactement 100. Il est possible que toutes les données n'aient pas été extraites (limite de page atteinte sans pagination).\n\n"
-
             sns_message = (
-                f"{warning_message}"
                 f"Traitement HelloAsso terminé (pour l'environnement '{environment}').\n\n"
                 f"Période couverte : du {from_date_str} au {to_date_str}\n"
                 f"Nombre total d'enregistrements traités : {len(all_api_items)}\n\n" 
@@ -472,7 +906,7 @@ def lambda_handler(event, context):
                 f"(Bucket: {s3_bucket_name})"
             )
 
-            publish_sns_notification(sns_topic_arn, sns_subject, sns_message)
+            publish_sns_notifications(sns_topic_arn, [{'Subject': sns_subject, 'Message': sns_message}])
 
         else:
             logger.warning("SNS_TOPIC_ARN environment variable not set. Skipping SNS notification.")
@@ -481,7 +915,7 @@ def lambda_handler(event, context):
 
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': json_dumps({
                 'message': f'Processing complete for period {from_date_str} to {to_date_str}. Results saved as CSV to S3.', # Mentionner CSV
                 'period_from': from_date_str,
                 'period_to': to_date_str,
@@ -494,31 +928,32 @@ def lambda_handler(event, context):
 
 
     except KeyError as e:
-        logger.error(f"Missing environment variable: {e}", exc_info=True)
+        logger.error("Missing environment variable: %s", e, exc_info=True)
         return {
             'statusCode': 500,
-            'body': json.dumps({'message': f'Configuration Error: Missing environment variable {e}'})
+            'body': json_dumps({'message': f'Configuration Error: Missing environment variable {e}'})
         }
     except Exception as e:
         logger.exception("Lambda execution failed!")
         if sns_topic_arn:
-             from_date_val = locals().get('from_date_str', 'N/A')
-             to_date_val = locals().get('to_date_str', 'N/A')
-             page_val = locals().get('page_num', 'N/A')
              error_subject = error_sns_subject_template.format(
-                 from_date=from_date_val,
-                 to_date=to_date_val,
+                 from_date=execution_context.from_date_str,
+                 to_date=execution_context.to_date_str,
                  environment=environment
              )
 
+             error_location = f"l'étape : {execution_context.step}"
+             if execution_context.page_num != 'N/A':
+                 error_location += f", page {execution_context.page_num}"
+
              error_message = (
-                 f"L'exécution de la Lambda a échoué pour la période {from_date_val} à {to_date_val}.\n"
-                 f"(Erreur potentiellement survenue lors du traitement de la page {page_val})\n"
+                 f"L'exécution de la Lambda a échoué pour la période {execution_context.from_date_str} à {execution_context.to_date_str}.\n"
+                 f"(Erreur survenue lors de {error_location})\n"
                  f"Erreur: {str(e)}\nConsultez les logs CloudWatch pour plus de détails."
              )
-             publish_sns_notification(sns_topic_arn, error_subject, error_message)
+             publish_sns_notifications(sns_topic_arn, [{'Subject': error_subject, 'Message': error_message}])
 
         return {
             'statusCode': 500,
-            'body': json.dumps({'message': 'Internal Server Error', 'error': str(e)})
+            'body': json_dumps({'message': 'Internal Server Error', 'error': str(e)})
         }
\ No newline at end of file
@@ -40,7 +40,9 @@ resource "aws_lambda_function" "api_processor" {
   role             = aws_iam_role.lambda_role.arn
   handler          = "main.lambda_handler"
   runtime          = "python3.11"
-  timeout          = 15
+  # API requests are cut off API_DEADLINE_MARGIN_SECONDS (10 s) before this timeout
+  # (see api_timeout in lambda/main.py), leaving time for the S3 upload or the error notification
+  timeout          = 60
   memory_size      = 256
   architectures    = ["arm64"]
 
@@ -56,6 +58,7 @@ resource "aws_lambda_function" "api_processor" {
       SNS_TOPIC_ARN                = aws_sns_topic.results_notification.arn
       SUCCESS_SNS_SUBJECT_TEMPLATE = var.success_sns_subject_template
       ERROR_SNS_SUBJECT_TEMPLATE   = var.error_sns_subject_template
+      COMPRESS_RESULTS             = tostring(var.compress_results)
 
     }
   }
@@ -153,7 +156,8 @@ resource "aws_iam_policy" "lambda_s3" {
       {
         Action = [
           "s3:PutObject",
-          "s3:GetObject"
+          "s3:GetObject",
+          "s3:AbortMultipartUpload"
         ]
         Effect   = "Allow"
         Resource = "${aws_s3_bucket.results_bucket.arn}/*"
@@ -274,6 +278,18 @@ resource "aws_s3_bucket_lifecycle_configuration" "results_lifecycle" {
     }
   }
 
+  # Multipart uploads left open when the Lambda is stopped before aborting them
+  rule {
+    id     = "abort-incomplete-multipart-uploads"
+    status = "Enabled"
+
+    filter {}
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+  }
+
 }
 
 resource "aws_s3_bucket_public_access_block" "results_access_block" {
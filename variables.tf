@@ -77,6 +77,12 @@ variable "presigned_url_expiration_seconds" {
   default     = 172800
 }
 
+variable "compress_results" {
+  description = "Whether to store the CSV file gzip-compressed (Content-Encoding: gzip, transparently decompressed by browsers)"
+  type        = bool
+  default     = true
+}
+
 variable "success_sns_subject_template" {
   description = "SNS subject template for success notification"
   type        = string